@@ -8,38 +8,50 @@
 # - Power usage (RAPL)
 # - Temperature monitoring
 # - Top processes consuming CPU
+# Usage:
+#   waybar-cpu.py          print one JSON object (waybar "interval" module)
+#   waybar-cpu.py --watch  keep running and print one JSON line per second,
+#                          SIGUSR1 forces an immediate full refresh
 # ----------------------------------------------------------------------------
 
 import json
+import sys
+import signal
 import psutil
-import subprocess
 import re
 import os
 import time
-import shutil
-import pickle
-from collections import deque
+import struct
+import heapq
+import bisect
+from array import array
 import math
-import pathlib
-import glob
 
 # ---------------------------------------------------
 # CONFIGURATION
 # ---------------------------------------------------
 CPU_ICON_GENERAL = ""
-HISTORY_FILE = "/tmp/waybar_cpu_history.pkl"
+RUNTIME_DIR = os.environ.get("XDG_RUNTIME_DIR")
+# History holds this user's tooltip and process names: keep it private, with
+# a per-uid /tmp fallback that load_history() only trusts if we own it
+HISTORY_FILE = (os.path.join(RUNTIME_DIR, "waybar_cpu_history.bin") if RUNTIME_DIR
+                else f"/tmp/waybar_cpu_history.{os.getuid()}.bin")
+# Per-user caches; without a runtime dir they are rebuilt every run
+CPU_NAME_CACHE = os.path.join(RUNTIME_DIR, "waybar_cpu_name") if RUNTIME_DIR else None
+COLORS_CACHE = os.path.join(RUNTIME_DIR, "waybar_colors.cache.json") if RUNTIME_DIR else None
 TOOLTIP_WIDTH = 50
+MIN_SAMPLE_INTERVAL = 1.0  # seconds; faster calls reuse the previous sample
+EMA_DECAY = 0.95           # per-core usage smoothing
+TOOLTIP_MAX_AGE = 2.0      # seconds; until then only the bar text is refreshed
+WATCH_INTERVAL = 1.0       # seconds between lines in --watch mode
+# Fixed-shape waybar payload: only the two free-form strings go through json
+OUTPUT_TEMPLATE = '{"text": %s, "tooltip": %s, "markup": "pango", "class": "cpu", "click-events": true}'
 
 # ---------------------------------------------------
 # THEME & COLORS
 # ---------------------------------------------------
-try:
-    import tomllib
-except ImportError:
-    tomllib = None
-
 def load_theme_colors():
-    theme_path = pathlib.Path.home() / ".config/waybar/colors.toml"
+    theme_path = os.path.expanduser("~/.config/waybar/colors.toml")
     defaults = {
         "black": "#000000", "red": "#ff0000", "green": "#00ff00", "yellow": "#ffff00",
         "blue": "#0000ff", "magenta": "#ff00ff", "cyan": "#00ffff", "white": "#ffffff",
@@ -47,50 +59,114 @@ def load_theme_colors():
         "bright_yellow": "#ffff55", "bright_blue": "#5555ff", "bright_magenta": "#ff55ff",
         "bright_cyan": "#55ffff", "bright_white": "#ffffff"
     }
-    if not tomllib or not theme_path.exists(): return defaults
+    try: theme_mtime = os.stat(theme_path).st_mtime_ns
+    except OSError: return defaults
+    # Parsed theme is kept as JSON, tagged with the exact path and mtime it
+    # came from: any change, including an older mtime from cp -p, misses
+    if COLORS_CACHE:
+        try:
+            with open(COLORS_CACHE, "r") as f:
+                cached = json.load(f)
+            if cached["path"] == theme_path and cached["mtime_ns"] == theme_mtime:
+                return cached["colors"]
+        except (OSError, ValueError, KeyError, TypeError): pass
+    # tomllib is only needed when the cache is stale
+    try:
+        import tomllib
+    except ImportError:
+        return defaults
     try:
-        data = tomllib.loads(theme_path.read_text())
+        with open(theme_path, "rb") as f:
+            data = tomllib.load(f)
         colors = data.get("colors", {})
         normal = colors.get("normal", {})
         bright = colors.get("bright", {})
-        return {**defaults, **normal, **{f"bright_{k}": v for k, v in bright.items()}}
+        theme = {**defaults, **normal, **{f"bright_{k}": v for k, v in bright.items()}}
     except Exception: return defaults
+    if COLORS_CACHE:
+        try:
+            with open(COLORS_CACHE, "w") as f:
+                json.dump({"path": theme_path, "mtime_ns": theme_mtime, "colors": theme}, f)
+        except OSError: pass
+    return theme
 
 COLORS = load_theme_colors()
 SECTION_COLORS = {"CPU": {"icon": COLORS["red"], "text": COLORS["red"]}}
 
-COLOR_TABLE = [
-    {"color": COLORS["blue"],           "cpu_gpu_temp": (0, 35),   "cpu_power": (0.0, 30)},
-    {"color": COLORS["cyan"],           "cpu_gpu_temp": (36, 45),  "cpu_power": (31.0, 60)},
-    {"color": COLORS["green"],          "cpu_gpu_temp": (46, 54),  "cpu_power": (61.0, 90)},
-    {"color": COLORS["yellow"],         "cpu_gpu_temp": (55, 65),  "cpu_power": (91.0, 120)},
-    {"color": COLORS["bright_yellow"],  "cpu_gpu_temp": (66, 75),  "cpu_power": (121.0,150)},
-    {"color": COLORS["bright_red"],     "cpu_gpu_temp": (76, 85),  "cpu_power": (151.0,180)},
-    {"color": COLORS["red"],            "cpu_gpu_temp": (86, 999), "cpu_power": (181.0,999)}
+# Per-core usage colors: CORE_COLORS[i] applies below CORE_COLOR_LIMITS[i]
+CORE_COLOR_LIMITS = [20, 40, 60, 80, 95]
+CORE_COLORS = ["#81c8be", "#a6d189", "#e5c890", "#ef9f76", "#ea999c", "#e78284"]
+
+# Pango fragments that only depend on the theme, built once
+BORDER_OPEN = f"<span foreground='{COLORS['white']}'>"
+TOOLTIP_HEADER = (
+    f"<span foreground='{SECTION_COLORS['CPU']['icon']}'>{CPU_ICON_GENERAL}</span> "
+    f"<span foreground='{SECTION_COLORS['CPU']['text']}'>CPU</span> - %s:"
+)
+CORE_SLOT = f"{BORDER_OPEN}[</span><span foreground='%s'>%s</span>{BORDER_OPEN}]</span>"
+DIE_TOP = f"{BORDER_OPEN}╭──┘└────┘⠿└─────┘└─╮</span>"
+DIE_BOTTOM = f"{BORDER_OPEN}╰──┐┌────┐⣶┌─────┐┌─╯</span>"
+# Fixed 6x4 core grid, edge characters for each row
+DIE_ROWS, DIE_COLS = 6, 4
+DIE_ROW_EDGES = [("┐", "┌"), ("│", "│"), ("┘", "└")] * 2
+# Strips markup to measure the visible width of a tooltip row
+PANGO_TAG_RE = re.compile(r"<[^>]*>")
+
+# COLOR_SCALE[i] applies up to and including COLOR_LIMITS[metric][i],
+# the last color covers everything above
+COLOR_SCALE = [
+    COLORS["blue"], COLORS["cyan"], COLORS["green"], COLORS["yellow"],
+    COLORS["bright_yellow"], COLORS["bright_red"], COLORS["red"]
 ]
+COLOR_LIMITS = {
+    "cpu_gpu_temp": [35, 45, 54, 65, 75, 85],
+    "cpu_power":    [30, 60, 90, 120, 150, 180],
+}
 
 def get_color(value, metric_type):
     if value is None: return "#ffffff"
     try: value = float(value)
     except ValueError: return "#ffffff"
-    for entry in COLOR_TABLE:
-        if metric_type in entry:
-            low, high = entry[metric_type]
-            if low <= value <= high: return entry["color"]
-    return COLOR_TABLE[-1]["color"]
+    if math.isnan(value): return "#ffffff"
+    return COLOR_SCALE[bisect.bisect_left(COLOR_LIMITS[metric_type], value)]
+
+def get_core_color(usage):
+    return CORE_COLORS[bisect.bisect_right(CORE_COLOR_LIMITS, usage)]
 
 # ---------------------------------------------------
 # HARDWARE DETECTION
 # ---------------------------------------------------
+_cpu_name = None
+
 def get_cpu_name():
+    # The model never changes while the machine is up: keep it in memory for
+    # --watch and in the runtime dir for one-shot runs
+    global _cpu_name
+    if _cpu_name: return _cpu_name
+    if CPU_NAME_CACHE:
+        try:
+            with open(CPU_NAME_CACHE, "r") as f:
+                _cpu_name = f.read()
+            # An empty file (e.g. an interrupted write) is a miss
+            if _cpu_name: return _cpu_name
+        except OSError:
+            pass
     try:
-        with open("/proc/cpuinfo", "r") as f:
-            for line in f:
-                if "model name" in line:
-                    return line.split(":")[1].strip()
+        # "model name" is in the first processor block
+        with open("/proc/cpuinfo", "rb") as f:
+            match = re.search(rb"model name\s*:\s*(.+)", f.read(4096))
+        if not match: return "Unknown CPU"
+        name = match.group(1).decode().strip()
     except:
-        pass
-    return "Unknown CPU"
+        return "Unknown CPU"
+    _cpu_name = name
+    if CPU_NAME_CACHE:
+        try:
+            with open(CPU_NAME_CACHE, "w") as f:
+                f.write(name)
+        except OSError:
+            pass
+    return name
 
 def get_rapl_path():
     # Find the energy_uj file for package-0 (CPU)
@@ -99,6 +175,7 @@ def get_rapl_path():
     
     # Search for intel-rapl or similar directories
     # Usually intel-rapl:0 is the package
+    import glob  # first run only
     paths = glob.glob(f"{base}/*/energy_uj")
     for p in paths:
         if "intel-rapl:0" in p or "package" in p:
@@ -106,185 +183,375 @@ def get_rapl_path():
     # Fallback to first found
     return paths[0] if paths else None
 
+def get_rapl_max_energy(rapl_path):
+    # Counter wraps at max_energy_range_uj, assume 32 bits when it is missing
+    try:
+        with open(os.path.join(os.path.dirname(rapl_path), "max_energy_range_uj"), "r") as f:
+            return int(f.read().strip())
+    except:
+        return 2**32
+
+def read_energy(rapl_path):
+    fd = os.open(rapl_path, os.O_RDONLY)
+    try:
+        return int(os.pread(fd, 32, 0))
+    finally:
+        os.close(fd)
+
+def get_cpu_temp():
+    max_cpu_temp = 0
+    try:
+        temps = psutil.sensors_temperatures() or {}
+        # Try common labels
+        for label in ["k10temp", "coretemp", "zenpower"]:
+            if label in temps:
+                for t in temps[label]:
+                    if t.current > max_cpu_temp:
+                        max_cpu_temp = int(t.current)
+    except: pass
+    return max_cpu_temp
+
+def get_cpu_freq():
+    try:
+        cpu_info = psutil.cpu_freq(percpu=False)
+        if cpu_info: return cpu_info.current or 0, cpu_info.max or 0
+    except: pass
+    return 0, 0
+
 # ---------------------------------------------------
 # HISTORY
 # ---------------------------------------------------
+# Binary layout in native byte order (the file never leaves this machine):
+#   header: core count, ring head index, ring fill count, last call timestamp
+#           (monotonic, like every timestamp in the file except create_time),
+#           RAPL counter wrap value, RAPL energy_uj path (length-prefixed),
+#           RAPL energy at the last sample and its monotonic timestamp
+#   arrays: usage ring buffer, per-core EMA, last per-core usage (float32),
+#           (busy, total) cpu_times for every core (float64)
+#   tail:   process table timestamp, entry count and ranking length, then
+#           one (pid, create_time, user+system cpu time) entry per process
+#           and one (usage, name) entry per ranked process, then the cached
+#           tooltip timestamp, byte length and UTF-8 markup
+# The arrays are raw array() buffers: loading is one frombytes() copy per
+# array and saving one tobytes(), with no per-value packing.
+HISTORY_HEADER = struct.Struct("=HBBdQ128pQd")
+PROCS_HEADER = struct.Struct("=dIB")
+PROC_ENTRY = struct.Struct("=Idd")
+TOP_ENTRY = struct.Struct("=d64p")
+TOOLTIP_CACHE_HEADER = struct.Struct("=dI")
+
+def read_array(view, offset, typecode, count):
+    values = array(typecode)
+    end = offset + values.itemsize * count
+    values.frombytes(view[offset:end])
+    return values, end
+
 def load_history():
     try:
         with open(HISTORY_FILE, 'rb') as f:
-            return pickle.load(f)
+            if os.fstat(f.fileno()).st_uid != os.getuid(): return None
+            data = f.read()
+        view = memoryview(data)
+        (ncores, head, count, last_call_ts, max_energy, rapl_path,
+         energy, energy_ts) = HISTORY_HEADER.unpack_from(data)
+        cpu, offset = read_array(view, HISTORY_HEADER.size, 'f', TOOLTIP_WIDTH)
+        per_core, offset = read_array(view, offset, 'f', ncores)
+        last_per_core, offset = read_array(view, offset, 'f', ncores)
+        times, offset = read_array(view, offset, 'd', 2 * ncores)
+        procs_ts, nprocs, ntop = PROCS_HEADER.unpack_from(data, offset)
+        procs_start = offset + PROCS_HEADER.size
+        procs_end = procs_start + nprocs * PROC_ENTRY.size
+        entries = PROC_ENTRY.iter_unpack(view[procs_start:procs_end])
+        procs = {pid: (created, cpu_total) for pid, created, cpu_total in entries}
+        top_end = procs_end + ntop * TOP_ENTRY.size
+        top = [(usage, name.decode(errors="replace"))
+               for usage, name in TOP_ENTRY.iter_unpack(view[procs_end:top_end])]
+        tooltip_ts, tooltip_len = TOOLTIP_CACHE_HEADER.unpack_from(data, top_end)
+        tooltip_start = top_end + TOOLTIP_CACHE_HEADER.size
+        if len(data) != tooltip_start + tooltip_len: return None
+        tooltip = data[tooltip_start:].decode()
     except:
-        return {'cpu': deque(maxlen=TOOLTIP_WIDTH), 'per_core': {}}
+        return None
+    return {
+        'head': head, 'count': count, 'last_call_ts': last_call_ts,
+        'rapl_path': os.fsdecode(rapl_path) or None, 'max_energy': max_energy,
+        'energy': energy, 'energy_ts': energy_ts,
+        'cpu': cpu, 'per_core': per_core, 'last_per_core': last_per_core,
+        'cpu_times': list(zip(times[0::2], times[1::2])),
+        'procs_ts': procs_ts, 'procs': procs, 'top': top,
+        'tooltip_ts': tooltip_ts, 'tooltip': tooltip,
+    }
 
-def save_history(cpu_hist, per_core_hist):
+def save_history(history):
+    procs = history['procs']
+    tooltip = history['tooltip'].encode()
     try:
-        with open(HISTORY_FILE, 'wb') as f:
-            pickle.dump({'cpu': cpu_hist, 'per_core': per_core_hist}, f)
+        buf = bytearray(HISTORY_HEADER.pack(
+            len(history['per_core']), history['head'], history['count'], history['last_call_ts'],
+            history['max_energy'], os.fsencode(history['rapl_path'] or ""),
+            history['energy'], history['energy_ts']))
+        buf += history['cpu'].tobytes()
+        buf += array('f', history['per_core']).tobytes()
+        buf += array('f', history['last_per_core']).tobytes()
+        buf += array('d', [v for pair in history['cpu_times'] for v in pair]).tobytes()
+        offset = len(buf)
+        buf += bytes(PROCS_HEADER.size + len(procs) * PROC_ENTRY.size)
+        PROCS_HEADER.pack_into(buf, offset, history['procs_ts'], len(procs), len(history['top']))
+        offset += PROCS_HEADER.size
+        for pid, (created, cpu_total) in procs.items():
+            PROC_ENTRY.pack_into(buf, offset, pid, created, cpu_total)
+            offset += PROC_ENTRY.size
+        for usage, name in history['top']:
+            buf += TOP_ENTRY.pack(usage, name.encode())
+        buf += TOOLTIP_CACHE_HEADER.pack(history['tooltip_ts'], len(tooltip))
+        buf += tooltip
+        tmp = HISTORY_FILE + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+        try: os.write(fd, buf)
+        finally: os.close(fd)
+        os.replace(tmp, HISTORY_FILE)
     except: pass
 
 # ---------------------------------------------------
-# MAIN LOGIC
+# CPU USAGE
 # ---------------------------------------------------
-history = load_history()
-cpu_history = history.get('cpu', deque(maxlen=TOOLTIP_WIDTH))
-per_core_history = history.get('per_core', {})
-
-cpu_name = get_cpu_name()
-max_cpu_temp = 0
-
-# Temperature
-try:
-    temps = psutil.sensors_temperatures() or {}
-    # Try common labels
-    for label in ["k10temp", "coretemp", "zenpower"]:
-        if label in temps:
-            for t in temps[label]:
-                if t.current > max_cpu_temp:
-                    max_cpu_temp = int(t.current)
-except: pass
-
-# Frequency
-current_freq = max_freq = 0
-try:
-    cpu_info = psutil.cpu_freq(percpu=False)
-    if cpu_info:
-        current_freq = cpu_info.current or 0
-        max_freq = cpu_info.max or 0
-except: pass
-
-# Power (RAPL)
-cpu_power = 0.0
-rapl_path = get_rapl_path()
-if rapl_path:
+# Usage is the cpu_times delta since the previous run (persisted in the
+# history file), so a regular tick never has to block waiting for a sample.
+def busy_total(t):
+    # guest time is already accounted for in user/nice
+    total = sum(t) - getattr(t, 'guest', 0) - getattr(t, 'guest_nice', 0)
+    return (total - t.idle - getattr(t, 'iowait', 0), total)
+
+def sample_cpu_times():
+    # Per core only; the aggregate is their mean, no second /proc/stat parse
+    return [busy_total(t) for t in psutil.cpu_times(percpu=True)]
+
+def percent_between(prev, cur):
+    busy, total = cur[0] - prev[0], cur[1] - prev[1]
+    if total <= 0: return 0.0
+    return round(min(max(busy / total * 100, 0.0), 100.0), 1)
+
+# ---------------------------------------------------
+# SAMPLING
+# ---------------------------------------------------
+def new_history():
+    # RAPL path and wrap value are fixed for the machine, resolve them once
+    rapl_path = get_rapl_path()
+    history = {'head': 0, 'count': 0, 'last_call_ts': 0.0, 'cpu': array('f', [0.0]) * TOOLTIP_WIDTH,
+               'rapl_path': rapl_path, 'max_energy': get_rapl_max_energy(rapl_path) if rapl_path else 0,
+               'energy': 0, 'energy_ts': time.monotonic(),
+               'per_core': None, 'last_per_core': None, 'cpu_times': sample_cpu_times(),
+               'procs_ts': time.monotonic(), 'procs': {}, 'top': [], 'tooltip_ts': 0.0, 'tooltip': ""}
+    try:
+        if rapl_path: history['energy'] = read_energy(rapl_path)
+    except: pass
+    # No previous sample yet: give both baselines one short shared window
+    time.sleep(0.1)
+    return history
+
+def sample_power(history, fresh_sample):
+    # Like CPU usage, power is averaged over the window since the previous
+    # sample: energy_uj and a monotonic timestamp are persisted with the
+    # cpu_times, so both figures always cover the same interval.
+    rapl_path = history['rapl_path']
+    if not rapl_path: return 0.0
+    cpu_power = 0.0
     try:
-        with open(rapl_path, "r") as f: energy1 = int(f.read().strip())
-        time.sleep(0.05)
-        with open(rapl_path, "r") as f: energy2 = int(f.read().strip())
-        
-        delta = energy2 - energy1
+        energy = read_energy(rapl_path)
+        energy_ts = time.monotonic()
+        delta = energy - history['energy']
         # Handle overflow
-        if delta < 0: 
-            # Try to find max range
-            max_f = os.path.join(os.path.dirname(rapl_path), "max_energy_range_uj")
-            if os.path.exists(max_f):
-                with open(max_f, "r") as f: max_e = int(f.read().strip())
-                delta = (max_e + energy2) - energy1
+        if delta < 0:
+            delta = (history['max_energy'] + energy) - history['energy']
+
+        elapsed = energy_ts - history['energy_ts']
+        if elapsed > 0: cpu_power = (delta / 1_000_000) / elapsed
+        if fresh_sample: history.update(energy=energy, energy_ts=energy_ts)
+    except: pass
+    return cpu_power
+
+def sample_usage(history, now, fresh_sample):
+    if not fresh_sample:
+        # Polled faster than MIN_SAMPLE_INTERVAL: reuse the last result
+        return history['cpu'][history['head'] - 1], history['last_per_core']
+
+    prev_times = history['cpu_times']
+    cur_times = sample_cpu_times()
+    per_core = [percent_between(p, c) for p, c in zip(prev_times, cur_times)]
+    cpu_percent = round(sum(per_core) / len(per_core), 1) if per_core else 0.0
+    # Circular buffer: overwrite the oldest slot instead of shifting
+    head = history['head']
+    history['cpu'][head] = cpu_percent
+    history['head'] = (head + 1) % TOOLTIP_WIDTH
+    history['count'] = min(history['count'] + 1, TOOLTIP_WIDTH)
+
+    # Per Core
+    per_core_history = history['per_core'] or per_core
+    weight = 1 - EMA_DECAY
+    history['per_core'] = array('f', [prev * EMA_DECAY + usage * weight
+                                      for prev, usage in zip(per_core_history, per_core)])
+    history.update(cpu_times=cur_times, last_call_ts=now, last_per_core=per_core)
+    return cpu_percent, per_core
+
+def top_processes(history, now, fresh_sample, count=3):
+    # Share of one CPU since the previous run, from the persisted cpu_times of
+    # every process. Processes without a baseline get their lifetime average,
+    # which is what ps reports.
+    if not fresh_sample:
+        # Keep the baselines, so the ranking covers the same window as CPU%
+        return history['top']
+    procs = {}
+    candidates = []
+    own_pid = os.getpid()
+    elapsed = now - history['procs_ts']
+    # create_time is wall-clock, so the lifetime average needs time.time()
+    wall_now = time.time()
+    try:
+        for proc in psutil.process_iter(['name', 'cpu_times', 'create_time']):
+            name, times, created = proc.info['name'], proc.info['cpu_times'], proc.info['create_time']
+            if times is None or created is None: continue
+            cpu_total = times.user + times.system
+            procs[proc.pid] = (created, cpu_total)
+            if proc.pid == own_pid or "waybar" in (name or ""): continue
+            prev = history['procs'].get(proc.pid)
+            if prev and prev[0] == created and elapsed > 0:
+                usage = (cpu_total - prev[1]) / elapsed * 100
             else:
-                delta = (2**32 + energy2) - energy1
-                
-        cpu_power = (delta / 1_000_000) / 0.05
+                usage = cpu_total / max(wall_now - created, 1) * 100
+            candidates.append((usage, name or "?"))
     except: pass
-
-cpu_percent = psutil.cpu_percent(interval=0.1)
-cpu_history.append(cpu_percent)
-
-# Per Core
-per_core = psutil.cpu_percent(interval=0.1, percpu=True)
-decay_factor = 0.95
-for i, usage in enumerate(per_core):
-    if i not in per_core_history:
-        per_core_history[i] = usage
-    else:
-        per_core_history[i] = (per_core_history[i] * decay_factor) + (usage * (1 - decay_factor))
-
-def get_core_color(usage):
-    if usage < 20: return "#81c8be"
-    elif usage < 40: return "#a6d189"
-    elif usage < 60: return "#e5c890"
-    elif usage < 80: return "#ef9f76"
-    elif usage < 95: return "#ea999c"
-    else: return "#e78284"
+    top = heapq.nlargest(count, candidates)
+    history.update(procs_ts=now, procs=procs, top=top)
+    return top
 
 # ---------------------------------------------------
 # TOOLTIP
 # ---------------------------------------------------
-tooltip_lines = []
-
-tooltip_lines.append(
-    f"<span foreground='{SECTION_COLORS['CPU']['icon']}'>{CPU_ICON_GENERAL}</span> "
-    f"<span foreground='{SECTION_COLORS['CPU']['text']}'>CPU</span> - {cpu_name}:"
-)
+def build_tooltip(cpu_name, max_cpu_temp, current_freq, max_freq, cpu_power, cpu_percent, per_core, top):
+    tooltip_lines = [TOOLTIP_HEADER % cpu_name]
+
+    cpu_rows = [
+        ("󱎫", f"Clock Speed: <span foreground='{get_color((current_freq/max_freq*100) if max_freq > 0 else 0, 'cpu_power')}'>{current_freq/1000:.2f} GHz</span> / {max_freq/1000:.2f} GHz"),
+        ("", f"Temperature: <span foreground='{get_color(max_cpu_temp,'cpu_gpu_temp')}'>{max_cpu_temp}°C</span>"),
+        ("", f"Power: <span foreground='{get_color(cpu_power,'cpu_power')}'>{cpu_power:.1f} W</span>"),
+        ("󰓅", f"Utilization: <span foreground='{get_color(cpu_percent,'cpu_power')}'>{cpu_percent:.0f}%</span>")
+    ]
+
+    max_line_len = max(len(PANGO_TAG_RE.sub('', line_text)) for _, line_text in cpu_rows) + 5
+    max_line_len = max(max_line_len, 29)
+    tooltip_lines.append("─" * max_line_len)
+    for icon, text_row in cpu_rows:
+        tooltip_lines.append(f"{icon} | {text_row}")
+
+    # CPU Die Visualization
+    cpu_viz_width = 25
+    center_padding = " " * int((max_line_len - cpu_viz_width) // 2)
+    substrate_color = get_color(max_cpu_temp, 'cpu_gpu_temp')
+    sub_open = f"<span foreground='{substrate_color}'>"
+    indent = f"{center_padding}  "
+    substrate_run = f"{sub_open}░░░░░░░░░░░░░░░░░░░</span>"
+
+    tooltip_lines.append("")
+    tooltip_lines.append(indent + DIE_TOP)
+    tooltip_lines.append(f"{indent}{BORDER_OPEN}┘</span>{substrate_run}{BORDER_OPEN}└</span>")
+
+    slot_count = DIE_ROWS * DIE_COLS
+    slots = [CORE_SLOT % (get_core_color(usage), "●" if usage >= 10 else "○") for usage in per_core[:slot_count]]
+    slots += [f"{sub_open}░░░</span>"] * (slot_count - len(slots))
+    slot_gap = f"{sub_open}░</span>"
+    for row, (start_char, end_char) in enumerate(DIE_ROW_EDGES):
+        tooltip_lines.append(
+            f"{indent}{BORDER_OPEN}{start_char}</span>{sub_open}░░</span>"
+            f"{slot_gap.join(slots[row * DIE_COLS:(row + 1) * DIE_COLS])}"
+            f"{sub_open}░░</span>{BORDER_OPEN}{end_char}</span>"
+        )
+
+    tooltip_lines.append(f"{indent}{BORDER_OPEN}┐</span>{substrate_run}{BORDER_OPEN}┌</span>")
+    tooltip_lines.append(indent + DIE_BOTTOM)
+
+    # Top Processes
+    tooltip_lines.append("")
+    tooltip_lines.append("Top Current Processes:")
+    for usage, name in top:
+        if len(name) > 15: name = name[:14] + "…"
+        color = get_core_color(usage)
+        tooltip_lines.append(f" • {name:<15} <span foreground='{color}'> {usage:>5.1f}%</span>")
+
+    tooltip_lines.append("")
+    tooltip_lines.append(f"<span foreground='{COLORS['white']}'>{'┈' * max_line_len}</span>")
+    tooltip_lines.append("󰍽 LMB: Btop")
+
+    return f"<span size='14000'>{'\n'.join(tooltip_lines)}</span>"
 
-cpu_rows = [
-    ("󱎫", f"Clock Speed: <span foreground='{get_color((current_freq/max_freq*100) if max_freq > 0 else 0, 'cpu_power')}'>{current_freq/1000:.2f} GHz</span> / {max_freq/1000:.2f} GHz"),
-    ("", f"Temperature: <span foreground='{get_color(max_cpu_temp,'cpu_gpu_temp')}'>{max_cpu_temp}°C</span>"),
-    ("", f"Power: <span foreground='{get_color(cpu_power,'cpu_power')}'>{cpu_power:.1f} W</span>"),
-    ("󰓅", f"Utilization: <span foreground='{get_color(cpu_percent,'cpu_power')}'>{cpu_percent:.0f}%</span>")
-]
+# ---------------------------------------------------
+# OUTPUT
+# ---------------------------------------------------
+def print_output(max_cpu_temp, tooltip):
+    text = f"{CPU_ICON_GENERAL} <span foreground='{get_color(max_cpu_temp,'cpu_gpu_temp')}'>{max_cpu_temp}°C</span>"
+    print(OUTPUT_TEMPLATE % (json.dumps(text), json.dumps(tooltip)))
 
-max_line_len = max(len(re.sub(r'<.*?>','',line_text)) for _, line_text in cpu_rows) + 5
-max_line_len = max(max_line_len, 29)
-tooltip_lines.append("─" * max_line_len)
-for icon, text_row in cpu_rows:
-    tooltip_lines.append(f"{icon} | {text_row}")
-
-# CPU Die Visualization
-cpu_viz_width = 25
-center_padding = " " * int((max_line_len - cpu_viz_width) // 2)
-substrate_color = get_color(max_cpu_temp, 'cpu_gpu_temp')
-border_color = COLORS['white']
-
-tooltip_lines.append("")
-tooltip_lines.append(f"{center_padding}  <span foreground='{border_color}'>╭──┘└────┘⠿└─────┘└─╮</span>")
-tooltip_lines.append(f"{center_padding}  <span foreground='{border_color}'>┘</span><span foreground='{substrate_color}'>░░░░░░░░░░░░░░░░░░░</span><span foreground='{border_color}'>└</span>")
-
-# Grid layout for cores (adjust rows/cols based on core count if needed, fixed 6x4 here)
-row_patterns = [("┐", "┌"), ("│", "│"), ("┘", "└")] * 2
-for row in range(6):
-    start_char, end_char = row_patterns[row]
-    line_parts = [f"{center_padding}  <span foreground='{border_color}'>{start_char}</span><span foreground='{substrate_color}'>░░</span>"]
-    for col in range(4):
-        core_idx = row * 4 + col
-        if core_idx < len(per_core):
-            usage = per_core[core_idx]
-            color = get_core_color(usage)
-            circle = "●" if usage >= 10 else "○"
-            line_parts.append(f"<span foreground='{border_color}'>[</span><span foreground='{color}'>{circle}</span><span foreground='{border_color}'>]</span>")
-        else:
-            line_parts.append(f"<span foreground='{substrate_color}'>░░░</span>")
-        if col < 3: line_parts.append(f"<span foreground='{substrate_color}'>░</span>")
-    line_parts.append(f"<span foreground='{substrate_color}'>░░</span><span foreground='{border_color}'>{end_char}</span>")
-    tooltip_lines.append("".join(line_parts))
-
-tooltip_lines.append(f"{center_padding}  <span foreground='{border_color}'>┐</span><span foreground='{substrate_color}'>░░░░░░░░░░░░░░░░░░░</span><span foreground='{border_color}'>┌</span>")
-tooltip_lines.append(f"{center_padding}  <span foreground='{border_color}'>╰──┐┌────┐⣶┌─────┐┌─╯</span>")
-
-# Top Processes
-tooltip_lines.append("")
-tooltip_lines.append("Top Current Processes:")
-try:
-    ps_cmd = ["ps", "-eo", "pcpu,comm,args", "--sort=-pcpu", "--no-headers"]
-    ps_output = subprocess.check_output(ps_cmd, text=True).strip()
-    count = 0
-    for line in ps_output.split('\n'):
-        if count >= 3: break
-        parts = line.strip().split(maxsplit=2)
-        if len(parts) >= 2:
-            try:
-                usage = float(parts[0])
-                name = parts[1]
-                if "waybar" in parts[2] if len(parts)>2 else "": continue
-                if len(name) > 15: name = name[:14] + "…"
-                color = get_core_color(usage)
-                tooltip_lines.append(f" • {name:<15} <span foreground='{color}'> {usage:>5.1f}%</span>")
-                count += 1
-            except: continue
-except: pass
-
-tooltip_lines.append("")
-tooltip_lines.append(f"<span foreground='{COLORS['white']}'>{'┈' * max_line_len}</span>")
-tooltip_lines.append("󰍽 LMB: Btop")
-
-save_history(cpu_history, per_core_history)
-
-TERMINAL = os.environ.get("TERMINAL") or shutil.which("alacritty") or "xterm"
-if os.environ.get("WAYBAR_CLICK_TYPE") == "left":
-    subprocess.Popen([TERMINAL, "-e", "btop"])
-
-print(json.dumps({
-    "text": f"{CPU_ICON_GENERAL} <span foreground='{get_color(max_cpu_temp,'cpu_gpu_temp')}'>{max_cpu_temp}°C</span>",
-    "tooltip": f"<span size='14000'>{'\n'.join(tooltip_lines)}</span>",
-    "markup": "pango",
-    "class": "cpu",
-    "click-events": True
-}))
\ No newline at end of file
+# ---------------------------------------------------
+# MAIN LOGIC
+# ---------------------------------------------------
+def tick(history, force=False):
+    """Print one waybar update; returns False if the cached tooltip was reused."""
+    # Monotonic time is system-wide on Linux, so it stays comparable across
+    # runs and is immune to wall-clock steps
+    now = time.monotonic()
+
+    # Waybar only shows the tooltip on hover: while the cached one is fresh,
+    # refresh just the temperature in the bar text and skip everything else.
+    # A negative age (clock restarted) counts as stale.
+    tooltip_age = now - history['tooltip_ts']
+    if not force and history['tooltip'] and 0 <= tooltip_age < TOOLTIP_MAX_AGE:
+        print_output(get_cpu_temp(), history['tooltip'])
+        return False
+
+    # A negative gap means the clock restarted (reboot with a persistent /tmp)
+    since_last = now - history['last_call_ts']
+    fresh_sample = since_last < 0 or since_last >= MIN_SAMPLE_INTERVAL
+    max_cpu_temp = get_cpu_temp()
+    current_freq, max_freq = get_cpu_freq()
+    cpu_power = sample_power(history, fresh_sample)
+    cpu_percent, per_core = sample_usage(history, now, fresh_sample)
+    top = top_processes(history, now, fresh_sample)
+
+    tooltip = build_tooltip(get_cpu_name(), max_cpu_temp, current_freq, max_freq,
+                            cpu_power, cpu_percent, per_core, top)
+    history.update(tooltip_ts=now, tooltip=tooltip)
+    print_output(max_cpu_temp, tooltip)
+    return True
+
+def get_terminal():
+    # Only called on click, so the PATH lookup costs nothing per tick
+    terminal = os.environ.get("TERMINAL")
+    if terminal: return terminal
+    import shutil
+    return shutil.which("alacritty") or "xterm"
+
+def main():
+    # One-shot mode: state lives in HISTORY_FILE between runs
+    click = os.environ.get("WAYBAR_CLICK_TYPE")
+    history = load_history() or new_history()
+    if tick(history, force=bool(click)):
+        save_history(history)
+
+    if click == "left":
+        import subprocess
+        subprocess.Popen([get_terminal(), "-e", "btop"])
+
+def watch():
+    # Long-running mode: state stays in memory, no per-tick interpreter start
+    history = load_history() or new_history()
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    force = True
+    while True:
+        tick(history, force)
+        sys.stdout.flush()
+        force = signal.sigtimedwait({signal.SIGUSR1}, WATCH_INTERVAL) is not None
+
+if __name__ == "__main__":
+    if "--watch" in sys.argv[1:]:
+        watch()
+    else:
+        main()
@@ -1,43 +1,64 @@
 #!/usr/bin/env python3
 import json
 import os
+import signal
+import sys
 
-def get_intel_gpu_data():
-    data = {"temp": 0, "freq": 0, "max_freq": 0}
+TEMP_PATH = "/sys/class/thermal/thermal_zone0/temp"
+FREQ_PATH = "/sys/class/drm/card0/gt_cur_freq_mhz"
+MAX_FREQ_PATH = "/sys/class/drm/card0/gt_max_freq_mhz"
+WATCH_INTERVAL = 1.0  # seconds between lines in --watch mode
+# Fixed-shape waybar payload: only the two free-form strings go through json
+OUTPUT_TEMPLATE = '{"text": %s, "tooltip": %s, "class": "gpu"}'
+
+def read_sysfs_int(path):
+    # Missing or unreadable files count as 0
     try:
-        # Temperatura (poate varia folderul, de obicei e in coretemp sau i915)
-        temp_path = "/sys/class/thermal/thermal_zone0/temp" 
-        if os.path.exists(temp_path):
-            with open(temp_path, "r") as f:
-                data["temp"] = int(int(f.read().strip()) / 1000)
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return 0
+    try:
+        return int(os.read(fd, 32))
+    except (OSError, ValueError):
+        return 0
+    finally:
+        os.close(fd)
 
+def get_intel_gpu_data():
+    return {
+        # Temperatura (poate varia folderul, de obicei e in coretemp sau i915)
+        "temp": int(read_sysfs_int(TEMP_PATH) / 1000),
         # Frecventa curenta (MHz)
-        freq_path = "/sys/class/drm/card0/gt_cur_freq_mhz"
-        if os.path.exists(freq_path):
-            with open(freq_path, "r") as f:
-                data["freq"] = int(f.read().strip())
-
+        "freq": read_sysfs_int(FREQ_PATH),
         # Frecventa maxima
-        max_freq_path = "/sys/class/drm/card0/gt_max_freq_mhz"
-        if os.path.exists(max_freq_path):
-            with open(max_freq_path, "r") as f:
-                data["max_freq"] = int(f.read().strip())
-    except:
-        pass
-    return data
-
-gpu = get_intel_gpu_data()
-usage_pct = int((gpu["freq"] / gpu["max_freq"] * 100)) if gpu["max_freq"] > 0 else 0
-
-# Culori in functie de temperatura
-color = "#81c8be" # Verde/Cyan default
-if gpu["temp"] > 60: color = "#e5c890" # Galben
-if gpu["temp"] > 75: color = "#e78284" # Rosu
-
-output = {
-    "text": f"󰢮 <span foreground='{color}'>{gpu['temp']}°C</span>",
-    "tooltip": f"Intel HD Graphics\nFrecvență: {gpu['freq']} / {gpu['max_freq']} MHz\nUtilizare: {usage_pct}%",
-    "class": "gpu"
-}
-
-print(json.dumps(output))
+        "max_freq": read_sysfs_int(MAX_FREQ_PATH),
+    }
+
+def main():
+    gpu = get_intel_gpu_data()
+    usage_pct = int((gpu["freq"] / gpu["max_freq"] * 100)) if gpu["max_freq"] > 0 else 0
+
+    # Culori in functie de temperatura
+    color = "#81c8be" # Verde/Cyan default
+    if gpu["temp"] > 60: color = "#e5c890" # Galben
+    if gpu["temp"] > 75: color = "#e78284" # Rosu
+
+    text = f"󰢮 <span foreground='{color}'>{gpu['temp']}°C</span>"
+    tooltip = f"Intel HD Graphics\nFrecvență: {gpu['freq']} / {gpu['max_freq']} MHz\nUtilizare: {usage_pct}%"
+
+    print(OUTPUT_TEMPLATE % (json.dumps(text), json.dumps(tooltip)))
+
+def watch():
+    # Long-running mode (waybar module without "interval"): one JSON line
+    # per tick from a single process, SIGUSR1 refreshes immediately
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    while True:
+        main()
+        sys.stdout.flush()
+        signal.sigtimedwait({signal.SIGUSR1}, WATCH_INTERVAL)
+
+if __name__ == "__main__":
+    if "--watch" in sys.argv[1:]:
+        watch()
+    else:
+        main()
@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
 import json
-import psutil
+import signal
+import sys
+
+WATCH_INTERVAL = 1.0  # seconds between lines in --watch mode
+# Fixed-shape waybar payload: only the two free-form strings go through json
+OUTPUT_TEMPLATE = '{"text": %s, "tooltip": %s, "markup": "pango", "class": "memory"}'
 
 def main():
-    mem = psutil.virtual_memory()
-    pct = mem.percent
-    used = mem.used / (1024**3)
-    total = mem.total / (1024**3)
+    # MemTotal and MemAvailable are the first lines of /proc/meminfo (kB)
+    with open("/proc/meminfo", "rb") as f:
+        data = f.read(256)
+    total_kb = int(data.split(b"MemTotal:")[1].split()[0])
+    avail_kb = int(data.split(b"MemAvailable:")[1].split()[0])
+    used_kb = total_kb - avail_kb
+    pct = round(used_kb / total_kb * 100, 1)
+    used = used_kb / (1024**2)
+    total = total_kb / (1024**2)
 
     lines = [
         "<span foreground='#a6d189'> Memory Info</span>",
@@ -16,12 +26,20 @@ def main():
         f"Usage: {pct}%"
     ]
 
-    print(json.dumps({
-        "text": f" <span foreground='#a6d189'>{pct}%</span>",
-        "tooltip": "\n".join(lines),
-        "markup": "pango",
-        "class": "memory"
-    }))
+    text = f" <span foreground='#a6d189'>{pct}%</span>"
+    print(OUTPUT_TEMPLATE % (json.dumps(text), json.dumps("\n".join(lines))))
+
+def watch():
+    # Long-running mode (waybar module without "interval"): one JSON line
+    # per tick from a single process, SIGUSR1 refreshes immediately
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    while True:
+        main()
+        sys.stdout.flush()
+        signal.sigtimedwait({signal.SIGUSR1}, WATCH_INTERVAL)
 
 if __name__ == "__main__":
-    main()
+    if "--watch" in sys.argv[1:]:
+        watch()
+    else:
+        main()
@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 import json
-import subprocess
 import os
-import psutil
-import time
+import signal
+import sys
 
 SSD_ICON = "󰋊"
 TOOLTIP_WIDTH = 45
+WATCH_INTERVAL = 1.0  # seconds between lines in --watch mode
+# Fixed-shape waybar payload: only the two free-form strings go through json
+OUTPUT_TEMPLATE = '{"text": %s, "tooltip": %s, "markup": "pango", "class": "storage"}'
 
 def get_color(value, metric_type):
     if value < 40: return "#a6d189" # Verde
@@ -15,11 +17,16 @@ def get_color(value, metric_type):
 
 def main():
     try:
-        usage = psutil.disk_usage('/')
-        used_pct = int(usage.percent)
-        total_gb = usage.total / (1024**3)
-        used_gb = usage.used / (1024**3)
-        free_gb = usage.free / (1024**3)
+        # Same figures as psutil.disk_usage: "used" includes root-reserved
+        # blocks, "free" is what an unprivileged user can still write
+        st = os.statvfs('/')
+        total = st.f_blocks * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        free = st.f_bavail * st.f_frsize
+        used_pct = used * 100 // (used + free) if used + free else 0
+        total_gb = total / (1024**3)
+        used_gb = used / (1024**3)
+        free_gb = free / (1024**3)
 
         lines = []
         lines.append(f"<span foreground='#8caaee'>󰋊 Storage Dashboard</span>")
@@ -35,15 +42,22 @@ def main():
         bar = f"<span foreground='{get_color(used_pct, '')}'>{'█'*filled}</span><span foreground='#414559'>{'░'*(bar_w-filled)}</span>"
         lines.append(f"\n{bar} {used_pct}%")
 
-        output = {
-            "text": f"{SSD_ICON} <span foreground='{get_color(used_pct,'')}'>{used_pct}%</span>",
-            "tooltip": "\n".join(lines),
-            "markup": "pango",
-            "class": "storage"
-        }
-        print(json.dumps(output))
+        text = f"{SSD_ICON} <span foreground='{get_color(used_pct,'')}'>{used_pct}%</span>"
+        print(OUTPUT_TEMPLATE % (json.dumps(text), json.dumps("\n".join(lines))))
     except Exception as e:
-        print(json.dumps({"text": "Err", "tooltip": str(e)}))
+        print('{"text": "Err", "tooltip": %s}' % json.dumps(str(e)))
+
+def watch():
+    # Long-running mode (waybar module without "interval"): one JSON line
+    # per tick from a single process, SIGUSR1 refreshes immediately
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    while True:
+        main()
+        sys.stdout.flush()
+        signal.sigtimedwait({signal.SIGUSR1}, WATCH_INTERVAL)
 
 if __name__ == "__main__":
-    main()
+    if "--watch" in sys.argv[1:]:
+        watch()
+    else:
+        main()